@@ -1,11 +1,20 @@
 
 import os
+import asyncio
+import hashlib
+import mmap
+import sqlite3
 import importlib.util
-from dotenv import load_dotenv
 import sys
-import time
 import re
+import random
 import argparse 
+import atexit
+import logging
+import queue
+import collections
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 
 # --- ANSI Color Codes ---
 COLOR_GREEN = '\033[92m'  # Green for success/configured/installed
@@ -15,8 +24,36 @@ COLOR_BLUE = '\033[94m'   # Blue for suggestions (like pip install)
 COLOR_CYAN = '\033[96m'   # Cyan for informational messages (like OK status)
 COLOR_RESET = '\033[0m'  # Reset color to default
 
-# Load environment variables from .env file (if it exists)
-load_dotenv()
+# --- Logging ---
+# Messages emitted while URLs are being analyzed go through this logger instead of print().
+# Records are handed to a queue and written to stderr by a background listener thread, so many
+# concurrent requests never contend on the console; set up once by setup_logging().
+log = logging.getLogger("aisug")
+
+class ColorFormatter(logging.Formatter):
+    """Colors warnings yellow and errors red, matching the script's console colors."""
+    LEVEL_COLORS = {logging.WARNING: COLOR_YELLOW, logging.ERROR: COLOR_RED, logging.CRITICAL: COLOR_RED}
+
+    def format(self, record):
+        message = super().format(record)
+        color = self.LEVEL_COLORS.get(record.levelno)
+        return f"{color}{message}{COLOR_RESET}" if color else message
+
+def setup_logging(level=logging.INFO):
+    """
+    Attaches a QueueHandler to the script logger and starts a QueueListener writing to stderr.
+    The listener is stopped (and the queue flushed) automatically at interpreter exit.
+    """
+    log_queue = queue.Queue()
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(ColorFormatter("%(message)s"))
+    listener = QueueListener(log_queue, stream_handler)
+    log.addHandler(QueueHandler(log_queue))
+    log.setLevel(level)
+    log.propagate = False # Do not duplicate records through the root logger
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
 
 # --- Model configuration ---
 # Keys are '1', '2', '3' to match expected command-line input.
@@ -41,18 +78,63 @@ models = {
     }
 }
 
+# --- Environment loading ---
+# The vendor SDKs are never imported at module level: validate_model_choice only probes them with
+# find_spec, and configure_ai_client imports just the SDK of the chosen model. That leaves
+# python-dotenv as the next-largest startup cost, so load_env_if_needed (called from main) only
+# imports it and loads .env when a needed variable is not already present in the environment.
+def load_env_if_needed(chosen_model_key, quiet=False):
+    """
+    Loads the .env file unless every variable that will be checked is already set.
+    With quiet=True only the chosen model's two variables matter; otherwise the status table
+    reports every model, so all of their variables are needed.
+    load_dotenv never overrides existing variables, so skipping it in that case changes nothing.
+    """
+    needed = [models[chosen_model_key]] if quiet else models.values()
+    if not all(os.getenv(config[var]) for config in needed for var in ('api_key_var', 'model_name_var')):
+        from dotenv import load_dotenv
+        load_dotenv() # Load environment variables from .env file (if it exists)
+
 # --- Global AI Client Variables ---
 # These will store the initialized AI clients after configuration.
+# Anthropic and OpenAI use their native async clients so that several URLs can be in flight at once.
 GEMINI_MODEL_CLIENT = None
 ANTHROPIC_CLIENT = None
 OPENAI_CLIENT = None
+# Model name used for API calls, keyed by model choice; filled once by configure_ai_client.
+_MODEL_NAME_FOR_API = {}
+# Persistent HTTP connection pool handed to the Anthropic/OpenAI client (closed at the end of the run).
+SHARED_HTTP_CLIENT = None
 
 # --- Helper Functions for Status Checking ---
 
+# Common placeholder values treated as "not configured" (already upper-cased for the
+# case-insensitive comparison in check_env_variable; empty values are rejected before the lookup).
+_PLACEHOLDERS = frozenset({
+    "YOUR_API_KEY_HERE", # Generic placeholder
+    "YOUR_MODEL_NAME_HERE", # Generic placeholder
+    "PLACEHOLDER",
+    "NONE",
+    "NULL",
+    "MISSING",
+    "CONFIG_ME",
+    "ENTER_YOUR_KEY",
+    "ADD_YOUR_MODEL",
+    # --- Specific placeholders from the sample .env file ---
+    "YOUR_GOOGLE_API_KEY",
+    "YOUR_GOOGLE_GEMINI_MODEL",
+    "YOUR_ANTHROPIC_CLAUDE_API_KEY_HERE",
+    "YOUR_ANTHROPIC_CLAUDE_MODEL_NAME_HERE",
+    "YOUR_OPENAI_GPT_API_KEY_HERE",
+    "YOUR_OPENAI_GPT_MODEL_NAME_HERE",
+})
+
+@lru_cache(maxsize=None)
 def check_library_installed(library_name):
     """
     Check if the specified Python library is installed in the current environment.
     Returns True if found, False otherwise.
+    Results are memoized per library name, since find_spec walks every sys.path entry.
     """
     try:
         # importlib.util.find_spec is the standard way to check for package existence
@@ -61,11 +143,14 @@ def check_library_installed(library_name):
         # Catch potential exceptions during the check itself
         return False
 
+@lru_cache(maxsize=None)
 def check_env_variable(var_name):
     """
     Check if the environment variable is set, has a non-empty value,
     and is not a common placeholder string.
     Returns True if the variable is considered valid and configured, False otherwise.
+    Results are memoized: the environment is loaded once at startup and treated as fixed
+    for the process lifetime. Call check_env_variable.cache_clear() if .env is ever reloaded.
     """
     value = os.getenv(var_name)
 
@@ -75,27 +160,7 @@ def check_env_variable(var_name):
 
     # 2. Check for common placeholder patterns (case-insensitive comparison after stripping)
     cleaned_value = value.strip().upper()
-    common_placeholders = [
-        "", # Already covered by strip() == '' but included for clarity
-        "YOUR_API_KEY_HERE", # Generic placeholder
-        "YOUR_MODEL_NAME_HERE", # Generic placeholder
-        "PLACEHOLDER",
-        "NONE",
-        "NULL",
-        "MISSING",
-        "CONFIG_ME",
-        "ENTER_YOUR_KEY",
-        "ADD_YOUR_MODEL",
-        # --- Added specific placeholders from the user's .env file (case-insensitive) ---
-        "YOUR_GOOGLE_API_KEY",
-        "YOUR_GOOGLE_GEMINI_MODEL",
-        "YOUR_ANTHROPIC_CLAUDE_API_KEY_HERE",
-        "YOUR_ANTHROPIC_CLAUDE_MODEL_NAME_HERE",
-        "YOUR_OPENAI_GPT_API_KEY_HERE",
-        "YOUR_OPENAI_GPT_MODEL_NAME_HERE"
-        # --- End of added placeholders ---
-    ]
-    if cleaned_value in common_placeholders:
+    if cleaned_value in _PLACEHOLDERS:
         return False # Value matches a known placeholder
 
     return True # Variable is set, non-empty, and not a recognized placeholder
@@ -103,6 +168,8 @@ def check_env_variable(var_name):
 
 # --- Analysis Prompt ---
 # (Keep the prompt as it is, it defines the AI's task)
+# There are two templates: the batch one below handles most requests (--batch-size defaults to 30),
+# this one single URLs and batch fallbacks. When customizing the task, edit both.
 ANALYSIS_PROMPT_TEMPLATE = """
 **Role:** You are an AI designed to perform static analysis of URL strings for potential sensitive information.
 **Objective:** Determine if a provided URL string, analyzed purely as text, contains patterns indicative of sensitive data.
@@ -119,20 +186,42 @@ Do not include any other text, explanations, or punctuation in your response.
 URL: {url_string}
 """
 
+# Batch variant: several numbered URLs per request, one verdict line per URL in the response.
+# Keep its task wording in sync with ANALYSIS_PROMPT_TEMPLATE above.
+BATCH_ANALYSIS_PROMPT_TEMPLATE = """
+**Role:** You are an AI designed to perform static analysis of URL strings for potential sensitive information.
+**Objective:** For each of the {url_count} numbered URL strings below, analyzed purely as text, determine if it contains patterns indicative of sensitive data.
+**Constraints:**
+1.  You **MUST NOT** attempt to visit, access, or validate any URL in any way. Your analysis is strictly limited to the characters and structure of each string itself.
+2.  Your output **MUST BE** exactly {url_count} lines, one per URL in the same order, each of the form "<number>. SENSITIVE" or "<number>. OK". No other text, explanations, or punctuation are allowed.
+Use:
+- "SENSITIVE" (if the string suggests potential sensitive information)
+- "OK" (if the string does not suggest potential sensitive information)
+
+URLs:
+{url_list}
+"""
+
 # --- Function to display model status and VALIDATE the chosen model ---
-def validate_model_choice(chosen_model_key):
+def validate_model_choice(chosen_model_key, quiet=False):
     """
     Displays the status of each AI model based on library installation and
     environment variable configuration. Validates if the chosen model
     (passed as '1', '2', or '3') is available and configured.
+    With quiet=True only the chosen model is checked (one find_spec, two env
+    lookups) and the status table is not printed.
     Returns the validated choice key if valid and configured, None otherwise.
     """
     # The header "--- AI Model Status ---" is printed in main() before calling this function.
     model_statuses = {}
     available_models = {} # Store fully configured model keys
 
-    # Iterate through each model defined in the 'models' dictionary
-    for choice_key, config in models.items():
+    # Iterate through each model defined in the 'models' dictionary (only the chosen one when quiet)
+    if quiet and chosen_model_key in models:
+        models_to_check = {chosen_model_key: models[chosen_model_key]}
+    else:
+        models_to_check = models
+    for choice_key, config in models_to_check.items():
         model_name = config['name']
         # Check if the required library is installed
         library_installed = check_library_installed(config['library'])
@@ -185,7 +274,8 @@ def validate_model_choice(chosen_model_key):
         # --- End of Coloring Logic ---
 
         # Print the complete status message for the current model
-        print(status_message)
+        if not quiet:
+            print(status_message)
 
     # --- Validation Part ---
     # This section validates the *specific* model chosen by the user via command line.
@@ -199,11 +289,11 @@ def validate_model_choice(chosen_model_key):
 
     # Check if the chosen model is fully configured and available for use
     if status['fully_configured']:
-        print(f"Chosen model: {status['name']} ({choice_key}) - {COLOR_GREEN}Configuration Validated.{COLOR_RESET}")
+        print(f"Chosen model: {status['name']} ({chosen_model_key}) - {COLOR_GREEN}Configuration Validated.{COLOR_RESET}")
         return chosen_model_key # Return the validated key if successful
     else:
         # If the chosen model is NOT fully configured, print an error and explain why.
-        print(f"{COLOR_RED}Error: Chosen model {status['name']} ({choice_key}) is not fully configured.{COLOR_RESET}")
+        print(f"{COLOR_RED}Error: Chosen model {status['name']} ({chosen_model_key}) is not fully configured.{COLOR_RESET}")
         if not status['library_installed']:
             print(f"  Reason: Library '{status['config']['library']}' not installed.")
         else:
@@ -217,14 +307,37 @@ def validate_model_choice(chosen_model_key):
         return None # Indicate validation failure
 
 
+# --- Shared HTTP connection pool ---
+def shared_http_client_options(max_concurrency):
+    """
+    Returns the httpx options for the shared connection pool: enough keep-alive connections for
+    'max_concurrency' requests in flight, and HTTP/2 multiplexing when the 'h2' package is installed.
+    """
+    import httpx # Installed as a dependency of the anthropic/openai SDKs
+    return {
+        'http2': check_library_installed('h2'),
+        'limits': httpx.Limits(max_connections=max(64, 2 * max_concurrency),
+                               max_keepalive_connections=max(32, max_concurrency)),
+    }
+
+async def close_shared_http_client():
+    """Closes the shared connection pool, if one was created."""
+    global SHARED_HTTP_CLIENT
+    if SHARED_HTTP_CLIENT is not None:
+        await SHARED_HTTP_CLIENT.aclose()
+        SHARED_HTTP_CLIENT = None
+
+
 # --- Function to configure the selected AI client ---
-def configure_ai_client(model_choice_key):
+def configure_ai_client(model_choice_key, max_concurrency=1):
     """
     Configures the selected AI client based on the validated choice key ('1', '2', or '3').
     This function is called *after* validate_model_choice has confirmed the model is ready.
+    For Anthropic/OpenAI, a single keep-alive connection pool sized for 'max_concurrency' requests
+    in flight is shared by all calls, so TLS handshakes are not repeated per request.
     Returns True if configuration is successful, False otherwise.
     """
-    global GEMINI_MODEL_CLIENT, ANTHROPIC_CLIENT, OPENAI_CLIENT
+    global GEMINI_MODEL_CLIENT, ANTHROPIC_CLIENT, OPENAI_CLIENT, SHARED_HTTP_CLIENT
 
     # Safety check: Ensure the key is valid (though validate_model_choice should handle this)
     if model_choice_key not in models:
@@ -245,36 +358,41 @@ def configure_ai_client(model_choice_key):
          return False
 
 
-    # Attempt to configure the specific client based on the chosen model key
+    # Attempt to configure the specific client based on the chosen model key.
+    # Each branch imports only its own SDK, so the non-chosen vendors are never loaded.
     try:
         print(f"Configuring {model_name_str} client...")
         if model_choice_key == '1': # Gemini
             import google.generativeai as genai
             genai.configure(api_key=api_key)
-            # Attempt to create the model instance to verify the model name is likely valid
+            # Create the model instance once; a failure here hints that the model name may be invalid
             try:
-                temp_model_check = genai.GenerativeModel(model_name_env)
+                GEMINI_MODEL_CLIENT = genai.GenerativeModel(model_name_env)
             except Exception as model_e:
                 print(f"{COLOR_YELLOW}Warning: Configured {model_name_str} client, but the specified model name '{model_name_env}' might be invalid: {model_e}{COLOR_RESET}")
-                # Decide if this warning should prevent configuration success. For now, it's a warning.
-                pass
-
-            GEMINI_MODEL_CLIENT = genai.GenerativeModel(model_name_env)
+                raise # Without a model instance there is no client; the handler below reports the failure
             print(f"{COLOR_GREEN}{model_name_str} client configured using model: {model_name_env}.{COLOR_RESET}")
+            _MODEL_NAME_FOR_API[model_choice_key] = model_name_env # Cached for every analysis call
             return True
 
         elif model_choice_key == '2': # Anthropic
             import anthropic
-            ANTHROPIC_CLIENT = anthropic.Anthropic(api_key=api_key)
+            # The SDK's httpx client subclass keeps its default timeouts while we control pooling
+            SHARED_HTTP_CLIENT = anthropic.DefaultAsyncHttpxClient(**shared_http_client_options(max_concurrency))
+            ANTHROPIC_CLIENT = anthropic.AsyncAnthropic(api_key=api_key, http_client=SHARED_HTTP_CLIENT)
             # Add model name validation if possible with Anthropic library
             print(f"{COLOR_GREEN}{model_name_str} client configured. Will use model: {model_name_env} for calls.{COLOR_RESET}")
+            _MODEL_NAME_FOR_API[model_choice_key] = model_name_env # Cached for every analysis call
             return True
 
         elif model_choice_key == '3': # OpenAI
             import openai
-            OPENAI_CLIENT = openai.OpenAI(api_key=api_key)
+            # The SDK's httpx client subclass keeps its default timeouts while we control pooling
+            SHARED_HTTP_CLIENT = openai.DefaultAsyncHttpxClient(**shared_http_client_options(max_concurrency))
+            OPENAI_CLIENT = openai.AsyncOpenAI(api_key=api_key, http_client=SHARED_HTTP_CLIENT)
             # Add model name validation if possible with OpenAI library
             print(f"{COLOR_GREEN}{model_name_str} client configured. Will use model: {model_name_env} for calls.{COLOR_RESET}")
+            _MODEL_NAME_FOR_API[model_choice_key] = model_name_env # Cached for every analysis call
             return True
 
     except Exception as e:
@@ -288,6 +406,11 @@ def configure_ai_client(model_choice_key):
     return False # Should theoretically not be reached
 
 
+# --- Retry delay patterns (compiled once, matched against the lower-cased error message) ---
+_RE_GOOGLE = re.compile(r'retry_delay\s*{\s*seconds:\s*(\d+)\s*}') # Google API format
+_RE_AFTER = re.compile(r'retry after (\d+)\s*seconds')             # Common in various APIs
+_RE_TRYAGAIN = re.compile(r'try again in (\d+)s')                   # E.g. OpenAI rate limit messages
+
 # --- Function to parse retry delay from error message ---
 def parse_retry_delay(error_message):
     """
@@ -298,7 +421,7 @@ def parse_retry_delay(error_message):
     error_str = str(error_message).lower() # Case-insensitive matching for robustness
 
     # Pattern 1: retry_delay { seconds: XX } (Google API format)
-    match1 = re.search(r'retry_delay\s*{\s*seconds:\s*(\d+)\s*}', error_str)
+    match1 = _RE_GOOGLE.search(error_str)
     if match1:
         try:
             return int(match1.group(1))
@@ -306,7 +429,7 @@ def parse_retry_delay(error_message):
             pass # Ignore conversion error and try next pattern
 
     # Pattern 2: Retry after X seconds (common in various APIs)
-    match2 = re.search(r'retry after (\d+)\s*seconds', error_str)
+    match2 = _RE_AFTER.search(error_str)
     if match2:
         try:
             return int(match2.group(1))
@@ -316,157 +439,623 @@ def parse_retry_delay(error_message):
     # Pattern 3: specific 429 error messages that might contain delay info (e.g., OpenAI)
     if "rate limit reached" in error_str or "quota exceeded" in error_str:
         # Attempt to extract wait time if specified, e.g., "Please try again in 20s."
-        match_wait = re.search(r'try again in (\d+)s', error_str)
+        match_wait = _RE_TRYAGAIN.search(error_str)
         if match_wait:
             try:
                 return int(match_wait.group(1))
             except ValueError:
                 pass
         # If specific time not found in rate limit message, use a default reasonable delay
-        print(f"{COLOR_YELLOW}  Rate limit message detected, but specific delay not parsed. Using default 60s.{COLOR_RESET}")
+        log.warning("  Rate limit message detected, but specific delay not parsed. Using default 60s.")
         return 60 # Default delay for generic rate limit errors
 
     return None # Return None if no known retry delay pattern is found
 
 
-# --- Function to analyze a single URL using the selected AI ---
-def analyze_url_with_ai(model_choice_key, url):
+# --- Retry backoff settings ---
+RETRY_BACKOFF_BASE = 1  # Seconds; the backoff window doubles with every retry
+RETRY_BACKOFF_CAP = 60  # Seconds; upper bound for a single backoff window
+
+def backoff_delay(retries):
     """
-    Analyzes a single URL string using the selected AI model (identified by key '1', '2', or '3').
+    Truncated exponential backoff with full jitter: a random wait in [0, min(cap, base * 2**retries)].
+    The jitter spreads out retries of concurrent requests so they do not hit the API again all at once.
+    """
+    return random.uniform(0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * 2 ** retries))
+
+
+# --- Request rate limiting ---
+class AsyncTokenBucket:
+    """
+    Token bucket limiting how many AI requests start per minute.
+    The bucket starts full, so the first 'rate_per_minute' requests go out at full speed; after that,
+    tokens refill continuously and requests are spaced out only when the rate is actually reached.
+    """
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0 # Tokens added per second
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = None # Event loop time of the last refill
+        self.lock = asyncio.Lock() # Waiters are served in arrival order
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated is not None:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate) # Time until the next whole token
+
+
+# --- Typed API error classification ---
+@lru_cache(maxsize=None)
+def get_typed_api_errors(model_choice_key):
+    """
+    Returns the chosen SDK's exception classes grouped as (rate_limit, transient, auth, status) tuples.
+    'status' holds the SDK's generic HTTP status error; any of those with a 5xx status code counts as
+    transient (e.g. Anthropic's 529 OverloadedError, which is not an InternalServerError).
+    Imported lazily (the SDK is already loaded by configure_ai_client); empty tuples if unavailable.
+    """
+    try:
+        if model_choice_key == '1': # Gemini (errors come from google.api_core)
+            from google.api_core import exceptions as gexc
+            return ((gexc.ResourceExhausted,),
+                    (gexc.InternalServerError, gexc.ServiceUnavailable, gexc.DeadlineExceeded),
+                    (gexc.Unauthenticated, gexc.PermissionDenied),
+                    ()) # google.api_core maps status codes to the typed classes above
+        elif model_choice_key == '2': # Anthropic
+            import anthropic
+            return ((anthropic.RateLimitError,),
+                    (anthropic.InternalServerError, anthropic.APIConnectionError),
+                    (anthropic.AuthenticationError,),
+                    (anthropic.APIStatusError,))
+        elif model_choice_key == '3': # OpenAI
+            import openai
+            return ((openai.RateLimitError,),
+                    (openai.InternalServerError, openai.APIConnectionError),
+                    (openai.AuthenticationError,),
+                    (openai.APIStatusError,))
+    except (ImportError, AttributeError):
+        pass
+    return ((), (), (), ())
+
+def get_retry_after_header(error):
+    """
+    Reads the Retry-After header (in seconds) from the HTTP response attached to an SDK exception.
+    Returns the delay as a float, or None if there is no usable header.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None # HTTP-date form or garbage; fall back to other delay sources
+
+def classify_api_error(model_choice_key, error):
+    """
+    Classifies an exception raised during an API call.
+    Returns (kind, retry_after) where kind is 'rate_limit', 'transient', 'auth' or None (unhandled),
+    and retry_after is the server-suggested delay in seconds for rate limits (None if unknown).
+    The SDK's typed exceptions are checked first; message matching is only a fallback.
+    """
+    rate_limit_errors, transient_errors, auth_errors, status_errors = get_typed_api_errors(model_choice_key)
+    if rate_limit_errors and isinstance(error, rate_limit_errors):
+        retry_after = get_retry_after_header(error)
+        if retry_after is None and model_choice_key == '1':
+            retry_after = parse_retry_delay(error) # Google puts retry_delay in the error details
+        return 'rate_limit', retry_after
+    if transient_errors and isinstance(error, transient_errors):
+        return 'transient', None
+    if auth_errors and isinstance(error, auth_errors):
+        return 'auth', None
+    if status_errors and isinstance(error, status_errors) and (getattr(error, 'status_code', None) or 0) >= 500:
+        return 'transient', None # Any other server-side status (502, 503, 529 overloaded, ...)
+
+    # --- Fallback: match on the error message (unknown exception types) ---
+    error_message = str(error)
+    error_lower = error_message.lower() # Lower-cased once, reused by every check below
+    if "429" in error_message or "rate limit" in error_lower or "quota" in error_lower:
+        retry_after = get_retry_after_header(error)
+        return 'rate_limit', retry_after if retry_after is not None else parse_retry_delay(error_lower)
+    if "500" in error_message or "503" in error_message or "connection error" in error_lower or "service unavailable" in error_lower:
+        return 'transient', None
+    if "authenticationerror" in error_lower or "invalid api key" in error_lower or "401" in error_message:
+        return 'auth', None
+    return None, None
+
+
+# --- Function to send one prompt to the selected AI (with retries) ---
+async def request_ai_completion(model_choice_key, prompt, max_tokens, label):
+    """
+    Sends a prompt to the selected AI model (identified by key '1', '2', or '3') and returns the
+    response text stripped and upper-cased. 'label' (a URL or a batch description) is used in messages.
+    A blocked or empty reply is returned as an empty string, which callers treat as a defaulted 'OK'.
     Includes rate limit handling with retry delays and error handling.
-    Returns True if considered sensitive, False otherwise, and None if an error occurred or response is unclear.
+    This is a coroutine: retry waits use asyncio.sleep so other requests keep running meanwhile.
+    Returns None if an error occurred or retries were exhausted.
     Relies on the global client variables being configured *before* this function is called.
     """
-    prompt = ANALYSIS_PROMPT_TEMPLATE.format(url_string=url)
     response_text = None
     max_retries = 5 # Maximum number of retries for transient errors (like rate limits)
     retries = 0
 
     # Get the model configuration details needed for the API call
     if model_choice_key not in models:
-        print(f"{COLOR_RED}Internal Error: Invalid model choice key '{model_choice_key}' in analyze_url_with_ai.{COLOR_RESET}")
+        log.error("Internal Error: Invalid model choice key '%s' in request_ai_completion.", model_choice_key)
         return None # Should not happen if called after successful validation
 
-    model_config = models[model_choice_key]
-    model_name_env_var = model_config['model_name_var']
-    model_name_str = model_config['name']
-
-    # Get the actual model name from environment variables.
-    # We expect this to be valid because configure_ai_client succeeded, but add a safety check.
-    if check_env_variable(model_name_env_var):
-        model_name_for_api = os.getenv(model_name_env_var)
-    else:
-        # This indicates a serious internal error if reached, as validation/config should have caught it.
-        print(f"{COLOR_RED}Internal Error: Model name configuration ({model_name_env_var}) missing or invalid for {model_name_str} during analysis call. Cannot proceed.{COLOR_RESET}")
+    # The model name was read and validated once in configure_ai_client
+    model_name_for_api = _MODEL_NAME_FOR_API.get(model_choice_key)
+    if model_name_for_api is None:
+        # This indicates a serious internal error if reached, as configuration should have stored it.
+        log.error("Internal Error: No model name configured for %s during analysis call. Cannot proceed.", models[model_choice_key]['name'])
         return None # Cannot proceed without a valid model name
 
+    # Chat message list for Anthropic/OpenAI, built once per prompt (Gemini takes the prompt string directly)
+    messages = [{"role": "user", "content": prompt}]
+
     # Loop to attempt analysis with retries
     while retries < max_retries:
         try:
             # Ensure the correct global client is initialized before attempting the API call
             if model_choice_key == '1' and GEMINI_MODEL_CLIENT:
-                # print(f"  -> Analyzing with Gemini ({model_name_for_api})...") # Verbose logging
-                response = GEMINI_MODEL_CLIENT.generate_content(prompt)
+                log.debug("  -> Analyzing %s with Gemini (%s)...", label, model_name_for_api) # Verbose logging
+                response = await GEMINI_MODEL_CLIENT.generate_content_async(prompt)
                 # Handle potential safety blocks or empty responses from the API
                 if not response.parts:
-                    print(f"{COLOR_YELLOW}  Warning: Gemini response blocked or empty for URL: {url}. Treating as 'OK'.{COLOR_RESET}")
-                    # Decide how to handle blocked/empty responses. Defaulting to 'OK' might be safer
-                    # than marking as sensitive or failing the analysis for this URL.
-                    response_text = "OK" # Default to OK if blocked/empty
+                    log.warning("  Warning: Gemini response blocked or empty for %s. Treating as 'OK'.", label)
+                    # Defaulting to 'OK' might be safer than marking as sensitive or failing the analysis.
+                    # An empty text lets the caller tell this default apart from a real 'OK' verdict.
+                    response_text = "" # Default to OK if blocked/empty
                 else:
                     response_text = response.text.strip().upper() # Get the response text and format it
 
             elif model_choice_key == '2' and ANTHROPIC_CLIENT:
-                # print(f"  -> Analyzing with Anthropic ({model_name_for_api})...") # Verbose logging
-                message = ANTHROPIC_CLIENT.messages.create(
+                log.debug("  -> Analyzing %s with Anthropic (%s)...", label, model_name_for_api) # Verbose logging
+                message = await ANTHROPIC_CLIENT.messages.create(
                     model=model_name_for_api, # Use the actual model name from env for the API call
-                    max_tokens=10, # Limit tokens as we only expect "SENSITIVE" or "OK"
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ]
+                    max_tokens=max_tokens, # Limit tokens as we only expect "SENSITIVE"/"OK" verdicts
+                    messages=messages # Built once, reused across retries
                 )
                 # Extract the text content from the Anthropic response object
                 if message.content and isinstance(message.content, list) and len(message.content) > 0:
                     response_text = message.content[0].text.strip().upper()
                 else:
-                    print(f"{COLOR_YELLOW}  Warning: Received unexpected or empty content from Anthropic for URL: {url}. Treating as 'OK'.{COLOR_RESET}")
-                    response_text = "OK" # Default to OK
+                    log.warning("  Warning: Received unexpected or empty content from Anthropic for %s. Treating as 'OK'.", label)
+                    response_text = "" # Default to OK (see the Gemini branch)
 
             elif model_choice_key == '3' and OPENAI_CLIENT:
-                # print(f"  -> Analyzing with OpenAI ({model_name_for_api})...") # Verbose logging
-                response = OPENAI_CLIENT.chat.completions.create(
+                log.debug("  -> Analyzing %s with OpenAI (%s)...", label, model_name_for_api) # Verbose logging
+                response = await OPENAI_CLIENT.chat.completions.create(
                     model=model_name_for_api, # Use the actual model name from env for the API call
-                    max_tokens=10, # Limit tokens as we only expect "SENSITIVE" or "OK"
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ]
+                    max_tokens=max_tokens, # Limit tokens as we only expect "SENSITIVE"/"OK" verdicts
+                    messages=messages # Built once, reused across retries
                 )
                 # Extract the text content from the OpenAI response object
                 if response.choices and response.choices[0].message:
                     response_text = response.choices[0].message.content.strip().upper()
                 else:
-                     print(f"{COLOR_YELLOW}  Warning: Received unexpected or empty choices from OpenAI for URL: {url}. Treating as 'OK'.{COLOR_RESET}")
-                     response_text = "OK" # Default to OK
+                     log.warning("  Warning: Received unexpected or empty choices from OpenAI for %s. Treating as 'OK'.", label)
+                     response_text = "" # Default to OK (see the Gemini branch)
 
             else:
                 # This indicates an internal error: the chosen client was not configured.
-                print(f"{COLOR_RED}Error: Client for selected model option '{model_choice_key}' ({models[model_choice_key]['name']}) is not configured. Cannot perform analysis.{COLOR_RESET}")
+                log.error("Error: Client for selected model option '%s' (%s) is not configured. Cannot perform analysis.", model_choice_key, models[model_choice_key]['name'])
                 return None # Indicate an error
 
-            # --- Response Validation ---
-            # Check if the AI's response is one of the expected values ("SENSITIVE" or "OK")
-            if response_text == "SENSITIVE":
-                return True # Analysis indicates sensitive content
-            elif response_text == "OK":
-                return False # Analysis indicates OK content
-            else:
-                # Handle unexpected responses (e.g., the model didn't follow the prompt format)
-                print(f"{COLOR_YELLOW}  Warning: Received unexpected/unclear response from AI: '{response_text}'. Treating as 'OK'.{COLOR_RESET}")
-                # For automation, defaulting to OK might be safer than failing.
-                return False # Defaulting to OK for automation
+            return response_text
 
         except Exception as e:
             # Catch any exceptions that occur during the API call
-            error_message = str(e)
-            print(f"{COLOR_RED}  Error during AI analysis for URL {url}: {error_message}{COLOR_RESET}")
+            log.error("  Error during AI analysis for %s: %s", label, e)
+            error_kind, retry_after = classify_api_error(model_choice_key, e)
 
             # --- Rate Limit Handling ---
-            # Check for common rate limit indicators (status code 429, specific messages)
-            if "429" in error_message or "rate limit" in error_message.lower() or "quota" in error_message.lower():
-                delay = parse_retry_delay(error_message) # Attempt to parse suggested delay
-                wait_time = delay if delay is not None and delay > 0 else 60 # Use parsed delay or a default
+            # Honor the server-suggested delay when there is one, otherwise back off with jitter
+            if error_kind == 'rate_limit':
+                wait_time = retry_after if retry_after is not None and retry_after > 0 else backoff_delay(retries)
 
                 # Wait for the specified time before attempting a retry
-                print(f"{COLOR_YELLOW}  Rate limit likely hit. Waiting for {wait_time} seconds before retry {retries + 1}/{max_retries}...{COLOR_RESET}")
-                time.sleep(wait_time)
+                log.warning("  Rate limit likely hit. Waiting for %.1f seconds before retry %d/%d...", wait_time, retries + 1, max_retries)
+                await asyncio.sleep(wait_time)
                 retries += 1 # Increment retry counter
                 continue # Continue the while loop to attempt the API call again
 
             # --- Handle other potentially recoverable API errors ---
             # Example: 5xx server errors, network/connection issues
-            elif "500" in error_message or "503" in error_message or "connection error" in error_message.lower() or "service unavailable" in error_message.lower():
-                 wait_time = 15 * (retries + 1) # Implement a simple exponential backoff
-                 print(f"{COLOR_YELLOW}  Server-side or connection error encountered. Waiting {wait_time}s before retry {retries + 1}/{max_retries}...{COLOR_RESET}")
-                 time.sleep(wait_time)
+            elif error_kind == 'transient':
+                 wait_time = backoff_delay(retries) # Exponential backoff with full jitter
+                 log.warning("  Server-side or connection error encountered. Waiting %.1fs before retry %d/%d...", wait_time, retries + 1, max_retries)
+                 await asyncio.sleep(wait_time)
                  retries += 1
                  continue # Retry
 
             # --- Handle Authentication Errors (usually non-recoverable without config change) ---
-            elif "authenticationerror" in error_message.lower() or "invalid api key" in error_message.lower() or "401" in error_message:
-                 print(f"{COLOR_RED}  Authentication Error: Please check your API key for {models[model_choice_key]['name']} in the .env file. This is a non-recoverable error for this run.{COLOR_RESET}")
-                 return None # Non-recoverable error, stop processing this URL
+            elif error_kind == 'auth':
+                 log.error("  Authentication Error: Please check your API key for %s in the .env file. This is a non-recoverable error for this run.", models[model_choice_key]['name'])
+                 return None # Non-recoverable error, stop processing this request
 
             else:
                 # For any other unhandled exceptions, print an error and stop processing this URL.
-                print(f"{COLOR_RED}  An unhandled error occurred: {e}. Stopping analysis for this URL.{COLOR_RESET}")
+                log.error("  An unhandled error occurred: %s. Stopping analysis for %s.", e, label)
                 # Depending on the severity, you might choose to retry or log more details.
-                return None # Indicate failure for this URL
+                return None # Indicate failure for this request
 
     # If retries are exhausted and we still haven't returned a result
-    print(f"{COLOR_RED}  Error: Failed to get a clear response after {max_retries} retries for URL: {url}. Skipping.{COLOR_RESET}")
+    log.error("  Error: Failed to get a clear response after %d retries for %s. Skipping.", max_retries, label)
     return None # Indicate failure after exhausting retries
 
 
+# Verdict for a blocked, empty or unclear AI reply. It is reported and counted as OK, like before,
+# but never written to the verdict cache, so the URL is asked again on the next run.
+DEFAULTED_OK = object()
+
+# --- Function to analyze a single URL using the selected AI ---
+async def analyze_url_with_ai(model_choice_key, url):
+    """
+    Analyzes a single URL string using the selected AI model (identified by key '1', '2', or '3').
+    Returns True if considered sensitive, False if the AI answered OK, DEFAULTED_OK if the reply was
+    blocked, empty or unclear (treated as OK but not cached), and None if the request failed.
+    """
+    prompt = ANALYSIS_PROMPT_TEMPLATE.format(url_string=url)
+    response_text = await request_ai_completion(model_choice_key, prompt, 10, f"URL: {url}") # Only "SENSITIVE" or "OK" expected
+    if response_text is None:
+        return None # The request failed; details were already printed
+
+    # --- Response Validation ---
+    # Check if the AI's response is one of the expected values ("SENSITIVE" or "OK")
+    if response_text == "SENSITIVE":
+        return True # Analysis indicates sensitive content
+    elif response_text == "OK":
+        return False # Analysis indicates OK content
+    elif response_text == "":
+        return DEFAULTED_OK # Blocked or empty reply; the warning was already printed
+    else:
+        # Handle unexpected responses (e.g., the model didn't follow the prompt format)
+        log.warning("  Warning: Received unexpected/unclear response from AI: '%s'. Treating as 'OK'.", response_text)
+        # For automation, defaulting to OK might be safer than failing.
+        return DEFAULTED_OK # Defaulting to OK for automation
+
+
+# --- Function to analyze several URLs with a single AI request ---
+# One verdict line per URL, e.g. "3. SENSITIVE" (the number is optional but expected).
+# Markdown bold is tolerated around the number and/or the verdict ("**3. SENSITIVE**", "**3.** OK").
+_RE_BATCH_VERDICT = re.compile(r'^\s*\**\s*(?:(\d+)\s*\**\s*[.):\-]?\s*)?\**\s*(SENSITIVE|OK)\b')
+
+def parse_batch_response(response_text, expected_count):
+    """
+    Parses a batch response into a list of booleans (True = SENSITIVE), one per URL in prompt order.
+    Returns None if the response does not contain exactly one verdict for every URL.
+    """
+    numbered = {}
+    unnumbered = []
+    for line in response_text.splitlines():
+        match = _RE_BATCH_VERDICT.match(line)
+        if not match:
+            continue # Skip blank or chatty lines
+        is_sensitive = match.group(2) == "SENSITIVE"
+        if match.group(1) is not None:
+            numbered[int(match.group(1))] = is_sensitive
+        else:
+            unnumbered.append(is_sensitive)
+
+    # Prefer the numbered form; accept plain lines only if there is exactly one per URL
+    if len(numbered) == expected_count and set(numbered) == set(range(1, expected_count + 1)):
+        return [numbered[n] for n in range(1, expected_count + 1)]
+    if not numbered and len(unnumbered) == expected_count:
+        return unnumbered
+    return None
+
+async def analyze_batch(model_choice_key, urls):
+    """
+    Analyzes several URLs with a single AI request, which saves one round-trip per extra URL.
+    Returns a list of True/False verdicts in the order of 'urls', a list of None if the request
+    itself failed, or None if the response could not be parsed (the caller then falls back to
+    analyzing the URLs one by one).
+    """
+    url_list = "\n".join(f"{n}. {url}" for n, url in enumerate(urls, 1))
+    prompt = BATCH_ANALYSIS_PROMPT_TEMPLATE.format(url_count=len(urls), url_list=url_list)
+    response_text = await request_ai_completion(model_choice_key, prompt, 15 * len(urls), f"batch of {len(urls)} URLs")
+    if response_text is None:
+        return [None] * len(urls) # The request failed; details were already printed
+    return parse_batch_response(response_text, len(urls))
+
+
+# --- Local prefilter ---
+# Cheap regex checks that classify obvious URLs without any AI call.
+_BENIGN_EXT = re.compile(r'\.(css|js|png|jpe?g|gif|svg|ico|woff2?|ttf|map)(\?|$)', re.I) # Static assets
+_PLAIN_HOMEPAGE = re.compile(r'^https?://[^/?#]+/?$', re.I) # Bare host, no path or query
+_SENSITIVE_HINT = re.compile(r'(token|api[_-]?key|secret|password|auth|session|jwt|bearer|oauth)', re.I)
+# High-confidence: a credential-like query parameter that actually carries a value
+_SENSITIVE_PARAM = re.compile(r'[?&](access_token|id_token|token|api[_-]?key|secret|password|passwd|jwt|session_?id|sid)=[^&#]{8,}', re.I)
+
+def prefilter_url(url):
+    """
+    Classifies obvious URLs locally.
+    Returns True for a credential-like query parameter with a value, False for static assets or bare
+    homepages with no sensitive hint, and None when the URL has to go to the AI.
+    """
+    if _SENSITIVE_PARAM.search(url):
+        return True
+    if _SENSITIVE_HINT.search(url):
+        return None # Something looks sensitive but not conclusively; let the AI decide
+    if _BENIGN_EXT.search(url) or _PLAIN_HOMEPAGE.match(url):
+        return False
+    return None
+
+
+# --- Persistent verdict cache ---
+# Verdicts are stored in a small SQLite database so repeated URLs (in the same file or in later runs)
+# do not need another round-trip to the AI provider.
+VERDICT_CACHE_PATH = os.path.expanduser("~/.urlcache.db")
+
+def open_verdict_cache(cache_path):
+    """
+    Opens (or creates) the SQLite verdict cache at 'cache_path'.
+    Returns the connection, or None if the cache cannot be used (analysis then runs uncached).
+    """
+    try:
+        cache = sqlite3.connect(cache_path)
+        cache.execute("CREATE TABLE IF NOT EXISTS verdict(k BLOB PRIMARY KEY, v INT)")
+        return cache
+    except sqlite3.Error as e:
+        log.warning("Warning: Could not open verdict cache '%s': %s. Continuing without cache.", cache_path, e)
+        return None
+
+def verdict_cache_key(model_choice_key, url):
+    """
+    Builds the cache key for a URL: a 16-byte blake2b digest of the normalized URL.
+    The model key is part of the digest so verdicts from different AI providers are kept apart.
+    """
+    normalized = f"{model_choice_key}:{url.strip().lower()}"
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+def lookup_cached_verdict(cache, model_choice_key, url):
+    """
+    Returns the cached verdict for 'url' (True for SENSITIVE, False for OK), or None on a cache miss.
+    """
+    try:
+        row = cache.execute("SELECT v FROM verdict WHERE k=?", (verdict_cache_key(model_choice_key, url),)).fetchone()
+    except sqlite3.Error:
+        return None # Treat a broken cache as a miss
+    return None if row is None else bool(row[0])
+
+def store_verdicts(cache, model_choice_key, verdicts):
+    """
+    Stores a batch of (url, is_sensitive) pairs in the cache with a single commit.
+    Only real True/False verdicts are cached; failed (None) and defaulted (DEFAULTED_OK) results
+    are skipped so they get retried on the next run.
+    """
+    rows = [(verdict_cache_key(model_choice_key, url), int(is_sensitive)) for url, is_sensitive in verdicts if isinstance(is_sensitive, bool)]
+    if not rows:
+        return
+    try:
+        cache.executemany("INSERT OR REPLACE INTO verdict(k, v) VALUES (?, ?)", rows)
+        cache.commit() # One commit per batch keeps fsync cost off the per-URL path
+    except sqlite3.Error as e:
+        log.warning("Warning: Could not update verdict cache: %s", e)
+
+
+# --- Streaming input ---
+def iter_url_lines(path):
+    """
+    Yields the stripped, non-empty lines of 'path' one at a time.
+    The file is memory-mapped and read line by line, so it is never loaded into memory as a whole.
+    """
+    if os.path.getsize(path) == 0:
+        return # mmap cannot map an empty file
+    with open(path, 'rb') as infile, mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for line in iter(mm.readline, b''):
+            stripped = line.strip()
+            if stripped:
+                yield stripped.decode('utf-8', errors='replace')
+
+
+# --- Concurrent analysis helpers ---
+def report_verdict(index, is_sensitive, source=""):
+    """
+    Prints the verdict for one URL; the index keeps lines traceable when several URLs are in flight.
+    """
+    if is_sensitive is True:
+        log.info("  => [#%d] %sDetected as potentially SENSITIVE%s.%s", index + 1, COLOR_GREEN, source, COLOR_RESET)
+    elif is_sensitive is False or is_sensitive is DEFAULTED_OK:
+        log.info("  => [#%d] %sDetected as OK%s.%s", index + 1, COLOR_CYAN, source, COLOR_RESET)
+    else: # is_sensitive is None (the request failed)
+        log.info("  => [#%d] %sAnalysis failed or unclear response. Skipping this URL.%s", index + 1, COLOR_RED, COLOR_RESET)
+
+
+async def analyze_url_async(model_choice_key, url, index, semaphore, rate_limiter=None):
+    """
+    Analyzes one URL while holding a slot of the shared semaphore, so at most N requests are in flight.
+    If a rate limiter is given, the request also waits for one of its tokens.
+    Returns an (index, result) tuple so the caller can put the result back at the URL's position.
+    """
+    async with semaphore:
+        if rate_limiter is not None:
+            await rate_limiter.acquire()
+        log.info("Processing URL #%d: %s", index + 1, url)
+        is_sensitive = await analyze_url_with_ai(model_choice_key, url)
+        report_verdict(index, is_sensitive)
+        return index, is_sensitive
+
+
+async def analyze_batch_async(model_choice_key, urls, indices, semaphore, rate_limiter=None):
+    """
+    Analyzes the URLs at 'indices' with one AI request while holding a single semaphore slot.
+    The whole batch counts as one request for the rate limiter.
+    If the batch response cannot be parsed, the URLs are re-analyzed one by one (each taking its
+    own slot and token again). Returns a list of (index, result) tuples.
+    """
+    if len(indices) == 1:
+        return [await analyze_url_async(model_choice_key, urls[indices[0]], indices[0], semaphore, rate_limiter)]
+
+    async with semaphore:
+        if rate_limiter is not None:
+            await rate_limiter.acquire()
+        log.info("Processing URLs #%d-#%d in one batch (%d URLs)", indices[0] + 1, indices[-1] + 1, len(indices))
+        verdicts = await analyze_batch(model_choice_key, [urls[i] for i in indices])
+
+    if verdicts is None:
+        # The slot is released first so the single-URL fallback can acquire slots itself
+        log.warning("  Warning: Could not parse the batch response for URLs #%d-#%d. Falling back to one request per URL.", indices[0] + 1, indices[-1] + 1)
+        return list(await asyncio.gather(*(analyze_url_async(model_choice_key, urls[i], i, semaphore, rate_limiter) for i in indices)))
+
+    for index, is_sensitive in zip(indices, verdicts):
+        report_verdict(index, is_sensitive)
+    return list(zip(indices, verdicts))
+
+
+# Sensitive URLs are appended (and new verdicts committed to the cache) every this many results,
+# so an interrupted run keeps what it already found.
+FLUSH_EVERY = 256
+# The producer hands control back to the event loop at least every this many input lines.
+PRODUCER_YIELD_EVERY = 64
+
+async def analyze_url_stream(model_choice_key, url_lines, concurrency_limit, cache=None, batch_size=1, use_prefilter=True, requests_per_minute=0, output_file=None):
+    """
+    Analyzes the URLs produced by the iterable 'url_lines' while it is still being read.
+    A producer loop puts batches of URL indices on a bounded asyncio.Queue that 'concurrency_limit'
+    workers consume, so the first AI requests start right away instead of after the whole input.
+    With batch_size > 1, up to batch_size URLs are packed into each AI request.
+    With requests_per_minute > 0, AI requests are paced by a token bucket (0 means no limit).
+    Duplicate URLs are analyzed once. Obvious URLs (see prefilter_url) and URLs already present in the
+    verdict cache (if given) are answered locally.
+    Sensitive URLs are appended to 'output_file' (if given, once per input line, in input order) and new
+    verdicts are written back to the cache in batches of FLUSH_EVERY; whatever is left is flushed when
+    the analysis ends, including when it is cancelled (e.g. by Ctrl+C). A line is written only once
+    every line before it has its verdict, so an interrupted run leaves a prefix of the full output.
+    Returns (unique_urls, occurrences, results): the distinct URLs in first-occurrence order, how many
+    times each appeared in the input, and each one's result (True/False/None).
+    """
+    unique_urls = []   # Distinct URLs, first-occurrence order
+    occurrences = []   # occurrences[i]: number of input lines equal to unique_urls[i]
+    results = []       # results[i]: verdict for unique_urls[i]
+    seen = {}          # URL -> index into unique_urls
+    new_verdicts = []  # (url, result) pairs from the AI not yet written to the cache
+    pending = set()    # Indices queued for the AI whose verdict has not arrived yet
+    hits = []          # Sensitive URLs not yet written to output_file
+    unwritten = collections.deque() # Index of each input line not yet considered for output, input order
+
+    def flush_hits():
+        if output_file is not None and hits:
+            output_file.write("\n".join(hits) + "\n")
+            output_file.flush()
+        hits.clear()
+
+    def flush_verdicts():
+        if cache is not None and new_verdicts:
+            store_verdicts(cache, model_choice_key, new_verdicts)
+        new_verdicts.clear()
+
+    def collect_resolved_lines():
+        # Only the contiguous run of answered lines at the front; the rest waits for its verdicts
+        while unwritten and unwritten[0] not in pending:
+            index = unwritten.popleft()
+            if results[index] is True:
+                hits.append(unique_urls[index])
+        if len(hits) >= FLUSH_EVERY:
+            flush_hits()
+
+    semaphore = asyncio.Semaphore(concurrency_limit)
+    rate_limiter = AsyncTokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+    work_queue = asyncio.Queue(maxsize=concurrency_limit * 2) # Bounded: memory stays proportional to the queue
+
+    async def worker():
+        while True:
+            batch = await work_queue.get()
+            if batch is None:
+                return # Sentinel: no more work
+            try:
+                for index, is_sensitive in await analyze_batch_async(model_choice_key, unique_urls, batch, semaphore, rate_limiter):
+                    results[index] = is_sensitive
+                    pending.discard(index)
+                    new_verdicts.append((unique_urls[index], is_sensitive))
+                if len(new_verdicts) >= FLUSH_EVERY:
+                    flush_verdicts()
+            except Exception as e:
+                # Keep the worker alive so the producer never blocks on a full queue; the batch stays None
+                log.error("  Unexpected error while analyzing URLs #%d-#%d: %s", batch[0] + 1, batch[-1] + 1, e)
+            finally:
+                pending.difference_update(batch)
+                collect_resolved_lines()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency_limit)]
+    try:
+        batch = []
+        for line_number, url in enumerate(url_lines, 1):
+            if line_number % PRODUCER_YIELD_EVERY == 0:
+                # Duplicates, prefilter and cache hits never await; yield regularly so in-flight
+                # AI responses and the workers keep running on mostly cached or duplicate input
+                await asyncio.sleep(0)
+            index = seen.get(url)
+            if index is not None:
+                occurrences[index] += 1 # Duplicate: reuse the verdict of the first occurrence
+                unwritten.append(index)
+                collect_resolved_lines()
+                continue
+            index = len(unique_urls)
+            seen[url] = index
+            unique_urls.append(url)
+            occurrences.append(1)
+            results.append(None)
+
+            # Answer what we can locally; only the rest is queued for the AI
+            local_verdict = prefilter_url(url) if use_prefilter else None
+            source = " (local prefilter)"
+            if local_verdict is None and cache is not None:
+                local_verdict = lookup_cached_verdict(cache, model_choice_key, url)
+                source = " (cached)"
+            if local_verdict is not None:
+                results[index] = local_verdict
+                report_verdict(index, local_verdict, source=source)
+                unwritten.append(index)
+                collect_resolved_lines()
+                continue
+
+            pending.add(index)
+            unwritten.append(index)
+            batch.append(index)
+            if len(batch) >= batch_size:
+                await work_queue.put(batch) # Waits while the queue is full (backpressure)
+                await asyncio.sleep(0) # Let idle workers pick it up right away
+                batch = []
+        if batch:
+            await work_queue.put(batch)
+
+        # One sentinel per worker, then wait for the remaining work to finish
+        for _ in workers:
+            await work_queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel() # No-op for finished workers; stops them if the producer failed or was cancelled
+        # Save what was found so far, also when the run is interrupted
+        flush_hits()
+        flush_verdicts()
+
+    return unique_urls, occurrences, results
+
+
+async def run_url_analysis(*args):
+    """
+    Runs analyze_url_stream(*args) and then closes the shared HTTP connection pool.
+    Both happen inside the same event loop, which owns the pooled connections.
+    """
+    try:
+        return await analyze_url_stream(*args)
+    finally:
+        await close_shared_http_client()
+
+
 # --- Main Program ---
 def main():
     """Main function to handle argument parsing, file loading, processing, and saving."""
@@ -475,10 +1064,24 @@ def main():
     # Set up argument parser to handle command-line arguments
     parser = argparse.ArgumentParser(description="Analyze URLs for sensitive content using AI.")
     parser.add_argument("input_file", help="Path to the text file containing the list of URLs.")
-    parser.add_argument("concurrency", choices=['yes', 'no'], help="Concurrency setting (currently informational, 'yes' or 'no').")
+    parser.add_argument("concurrency", choices=['yes', 'no'], help="Concurrency setting ('yes' analyzes several URLs at once, 'no' analyzes one at a time).")
     parser.add_argument("model_choice", choices=['1', '2', '3'], help="AI Model choice key (1: Gemini, 2: Anthropic, 3: OpenAI).")
     parser.add_argument("-o", "--output", default="suggestion.txt", # Default output file name
                         help="Output file path for sensitive URLs (default: suggestion.txt)")
+    parser.add_argument("--concurrency-n", type=int, default=8,
+                        help="Maximum number of URLs analyzed at the same time when concurrency is 'yes' (default: 8)")
+    parser.add_argument("--batch-size", type=int, default=30,
+                        help="Number of URLs sent to the AI in a single request; 1 sends one URL per request (default: 30)")
+    parser.add_argument("--rpm", type=int, default=120,
+                        help="Maximum AI requests started per minute, set to your provider's rate limit; 0 disables the limit (default: 120)")
+    parser.add_argument("--no-prefilter", action="store_true",
+                        help="Send every URL to the AI instead of classifying obvious ones (static assets, credential parameters) locally")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Only check the chosen model at startup and skip the status table for the others")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Also log debug details for every AI request")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Do not read or write the persistent verdict cache ({VERDICT_CACHE_PATH})")
 
     # Check if enough command-line arguments were provided
     # sys.argv[0] is the script name itself, so we expect at least 4 arguments (script + 3 required args)
@@ -501,25 +1104,44 @@ def main():
         sys.exit(1)
 
 
+    # Route analysis messages through the queued logger
+    log_listener = setup_logging(logging.DEBUG if args.verbose else logging.INFO)
+
     # Assign parsed arguments to variables
     input_filename = args.input_file
-    concurrency_setting = args.concurrency # Store concurrency setting (for future use)
+    concurrency_setting = args.concurrency # Store concurrency setting ('yes' or 'no')
     model_choice_key = args.model_choice   # The user's chosen model key ('1', '2', or '3')
     output_filename = args.output         # The specified output file path
 
+    # Number of URLs analyzed at the same time. 'no' keeps the original one-at-a-time behaviour.
+    if args.concurrency_n < 1:
+        print(f"{COLOR_RED}Error: --concurrency-n must be at least 1 (got {args.concurrency_n}).{COLOR_RESET}")
+        sys.exit(1)
+    concurrency_limit = args.concurrency_n if concurrency_setting == 'yes' else 1
+    if args.batch_size < 1:
+        print(f"{COLOR_RED}Error: --batch-size must be at least 1 (got {args.batch_size}).{COLOR_RESET}")
+        sys.exit(1)
+    if args.rpm < 0:
+        print(f"{COLOR_RED}Error: --rpm must be 0 or more (got {args.rpm}).{COLOR_RESET}")
+        sys.exit(1)
+
 
     # Print script start information
     print(f"--- Script Started ---")
     print(f"Input file: {input_filename}")
-    print(f"Concurrency: {concurrency_setting}")
+    print(f"Concurrency: {concurrency_setting} (max {concurrency_limit} URL(s) in flight)")
+    print(f"Batch size: {args.batch_size} URL(s) per request")
+    print(f"Rate limit: {f'{args.rpm} request(s)/minute' if args.rpm else 'none'}")
     print(f"Chosen AI Model Key: {model_choice_key}")
     print(f"Output file: {output_filename}")
     print(f"----------------------")
 
     # --- Model Status Display and Validation ---
-    # Display the status of all configured models and validate the user's choice.
-    print("\n--- AI Model Status ---") # Print header before listing statuses
-    validated_choice = validate_model_choice(model_choice_key) # This function prints statuses and validates the chosen key
+    # Read .env first (only if needed), then display the status of the models and validate the user's choice.
+    load_env_if_needed(model_choice_key, args.quiet)
+    if not args.quiet:
+        print("\n--- AI Model Status ---") # Print header before listing statuses
+    validated_choice = validate_model_choice(model_choice_key, args.quiet) # This function prints statuses and validates the chosen key
 
     # If validation fails (returns None), print an error and exit.
     if validated_choice is None:
@@ -528,7 +1150,7 @@ def main():
 
     # --- Configure the selected AI client ---
     # If validation was successful, attempt to configure the chosen AI client.
-    if not configure_ai_client(validated_choice):
+    if not configure_ai_client(validated_choice, concurrency_limit):
         # If configuration fails, print an error and exit.
         print(f"{COLOR_RED}Failed to configure the selected AI client. Exiting.{COLOR_RESET}")
         sys.exit(1) # Exit with an error code
@@ -541,72 +1163,61 @@ def main():
             print(f"{COLOR_RED}Error: Input file not found at '{input_filename}'. Please check the path passed from the Go script.{COLOR_RESET}")
             sys.exit(1) # Exit if input file doesn't exist
 
-        # Open and read the input file, skipping empty lines.
-        with open(input_filename, 'r', encoding='utf-8') as infile:
-            urls = [line.strip() for line in infile if line.strip()] # Read non-empty lines, strip whitespace
+        # Print information about the analysis process
+        print(f"\nAnalyzing URLs from '{input_filename}' (streamed; duplicates are analyzed once)...")
+        # Explain where potentially sensitive URLs will be saved.
+        print(f"Potentially sensitive URLs will be appended to '{output_filename}'")
+
+        # Stream the non-empty lines of the input file into the concurrent analysis (bounded by concurrency_limit).
+        # Pass the validated model key so the analysis knows which client to use.
+        # Open the output file in append mode ('a') with explicit UTF-8 encoding.
+        # This will create the file if it doesn't exist or append to it if it does.
+        # Sensitive URLs are appended in input order while the analysis runs, flushed every FLUSH_EVERY hits through a 64 KiB buffer.
+        try:
+            outfile = open(output_filename, 'a', encoding='utf-8', buffering=1 << 16)
+        except IOError as e:
+             print(f"{COLOR_RED}Error creating or accessing output file '{output_filename}': {e}{COLOR_RESET}")
+             sys.exit(1) # Exit with an error code
+
+        cache = None if args.no_cache else open_verdict_cache(VERDICT_CACHE_PATH)
+        try:
+            unique_urls, occurrences, results = asyncio.run(run_url_analysis(
+                validated_choice, iter_url_lines(input_filename), concurrency_limit, cache, args.batch_size, not args.no_prefilter, args.rpm, outfile))
+        except KeyboardInterrupt:
+            # The analysis already flushed its hits and cache rows while being cancelled
+            log_listener.queue.join()
+            print(f"\n{COLOR_YELLOW}Interrupted. Sensitive URLs found so far were appended to '{output_filename}'.{COLOR_RESET}")
+            sys.exit(130)
+        finally:
+            outfile.close()
+            if cache is not None:
+                cache.close()
+            log_listener.queue.join() # Let queued analysis messages reach stderr before the summary
 
         # If the input file was empty, print a warning and exit normally.
-        if not urls:
+        if not unique_urls:
             print(f"{COLOR_YELLOW}Warning: The input file '{input_filename}' is empty or contains only whitespace. No URLs to process.{COLOR_RESET}")
-            # Optionally, ensure the output file exists even if empty.
-            try:
-                with open(output_filename, 'a', encoding='utf-8') as outfile:
-                    pass # Just ensure the file exists or is created
-            except IOError as e:
-                 print(f"{COLOR_RED}Error creating or accessing output file '{output_filename}': {e}{COLOR_RESET}")
-                 sys.exit(1)
-
             print("Analysis complete (no URLs found).")
             return # Exit normally
 
-        # Print information about the analysis process
-        print(f"\nAnalyzing {len(urls)} URLs from '{input_filename}'...")
-        # Explain where potentially sensitive URLs will be saved.
-        print(f"Potentially sensitive URLs will be appended to '{output_filename}'")
-
         sensitive_count = 0 # Counter for URLs detected as sensitive
         processed_count = 0 # Counter for URLs attempted for analysis
-        error_count = 0     # Counter for URLs where analysis failed or was unclear
+        error_count = 0     # Counter for URLs where the analysis failed
 
-        # Open the output file in append mode ('a') with explicit UTF-8 encoding.
-        # This will create the file if it doesn't exist or append to it if it does.
-        try:
-            with open(output_filename, 'a', encoding='utf-8') as outfile:
-                # Process each URL from the input list
-                for i, url in enumerate(urls):
-                    print(f"Processing URL {i + 1}/{len(urls)}: {url}")
-                    processed_count += 1 # Increment processed count for each URL
-
-                    # Call the AI analysis function for the current URL
-                    # Pass the validated model key so the function knows which client to use.
-                    is_sensitive = analyze_url_with_ai(validated_choice, url)
-
-                    # Handle the result of the analysis
-                    if is_sensitive is True:
-                        # If detected as sensitive, print green message and write to output file.
-                        print(f"  => {COLOR_GREEN}Detected as potentially SENSITIVE. Appending to {output_filename}{COLOR_RESET}")
-                        outfile.write(url + '\n')
-                        sensitive_count += 1 # Increment sensitive count
-                    elif is_sensitive is False:
-                        # If detected as OK, print cyan message.
-                        print(f"  => {COLOR_CYAN}Detected as OK.{COLOR_RESET}")
-                    else: # is_sensitive is None (analysis failed or unclear)
-                        # If analysis failed or response was unclear, print red message and increment error count.
-                        print(f"  => {COLOR_RED}Analysis failed or unclear response. Skipping this URL.{COLOR_RESET}")
-                        error_count += 1 # Increment error count
-
-                    # Adjust the delay as needed based on the API's rate limits.
-                    time.sleep(0.5) # 500ms delay between processing URLs
+        # Walk the distinct URLs; duplicates count once per input line
+        for count, is_sensitive in zip(occurrences, results):
+            processed_count += count # Increment processed count for each input line
 
-        except IOError as e:
-             # Catch errors specifically related to writing to the output file
-             print(f"{COLOR_RED}Error writing to output file '{output_filename}': {e}{COLOR_RESET}")
-             sys.exit(1) # Exit with an error code
+            # Handle the result of the analysis
+            if is_sensitive is True:
+                sensitive_count += count # Increment sensitive count
+            elif is_sensitive is None: # The request failed
+                error_count += count # Increment error count
 
         # --- Analysis Summary ---
         # Print a summary of the analysis results
         print("\n--- Analysis Summary ---")
-        print(f"Processed: {processed_count} URLs")
+        print(f"Processed: {processed_count} URLs ({len(unique_urls)} unique)")
         print(f"Detected as Sensitive: {sensitive_count} URLs")
         print(f"Errors/Skipped: {error_count} URLs")
         print(f"Results saved/appended to: '{output_filename}'")
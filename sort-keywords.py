@@ -3,10 +3,20 @@ import sys
 import os
 import re
 import signal
-import threading
-import requests
+import pickle
+import hashlib
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+import aiohttp
+import ahocorasick  # pyahocorasick
 import fitz  # PyMuPDF
-from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import hyperscan  # Optional: vectorized multi-literal matching on x86_64
+except ImportError:
+    hyperscan = None
 
 
 YELLOW = '\033[93m'
@@ -24,11 +34,137 @@ keywords = [
     "staff only", "management only", "internal only"
 ]
 
-pattern = re.compile("|".join(re.escape(kw) for kw in keywords), re.IGNORECASE)
+# Each keyword owns one bit of a per-URL mask; bits follow alphabetical order, so decoding yields sorted keywords
+KW_SORTED = sorted(keywords)
+KW_ID = {kw: i for i, kw in enumerate(KW_SORTED)}
+MIN_KEYWORD_LEN = min(len(kw) for kw in keywords)
+
+# Walks only the set bits, lowest first, so the keywords come out in rank (alphabetical) order
+def decode_keywords(mask):
+    found = []
+    while mask:
+        low_bit = mask & -mask
+        found.append(KW_SORTED[low_bit.bit_length() - 1])
+        mask ^= low_bit
+    return found
+
+# Matchers are built per scan worker process by build_matcher(), not pickled from the parent
+automaton = None
+hs_db = None
+
+# Built automatons are pickled here, one file per keyword set, so later runs skip the build
+AUTOMATON_CACHE_DIR = os.path.expanduser("~/.cache/sort-keywords")
+KEYWORDS_DIGEST = hashlib.blake2b("\n".join(KW_SORTED).encode(), digest_size=16).hexdigest()
+AUTOMATON_CACHE_PATH = os.path.join(AUTOMATON_CACHE_DIR, f"automaton-{KEYWORDS_DIGEST}.pkl")
+
+def load_automaton():
+    try:
+        with open(AUTOMATON_CACHE_PATH, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        pass  # Missing or unreadable cache: rebuild
+
+    # Aho-Corasick automaton over the lowercased keywords: one linear pass over the text finds all of them
+    built = ahocorasick.Automaton()
+    for kw in keywords:
+        built.add_word(kw.lower(), 1 << KW_ID[kw])
+    built.make_automaton()
+
+    try:
+        os.makedirs(AUTOMATON_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{AUTOMATON_CACHE_PATH}.{os.getpid()}.tmp"  # Workers may build at the same time
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(built, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, AUTOMATON_CACHE_PATH)
+    except OSError:
+        pass  # The cache is only an optimization
+    return built
+
+def compile_hyperscan_db():
+    db = hyperscan.Database()
+    db.compile(
+        expressions=[re.escape(kw).encode() for kw in KW_SORTED],
+        ids=list(range(len(KW_SORTED))),
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(keywords),
+    )
+    return db
+
+# Test-compiled once in the parent, so the fallback is decided and reported a single time
+def hyperscan_usable():
+    if hyperscan is None:
+        return False
+    try:
+        compile_hyperscan_db()
+        return True
+    except Exception as e:
+        print(f"{YELLOW}Hyperscan unavailable ({e}), using Aho-Corasick.{RESET}", file=sys.stderr, flush=True)
+        return False
+
+def build_matcher(use_hyperscan):
+    global automaton, hs_db
+    automaton = load_automaton()
+
+    # Prefer Hyperscan when the parent found it usable; falls back to the automaton silently otherwise
+    hs_db = None
+    if use_hyperscan:
+        try:
+            hs_db = compile_hyperscan_db()
+        except Exception:
+            hs_db = None
+
+# Worker processes leave Ctrl+C to the parent, which finishes the queued scans and saves results
+def init_scan_worker(use_hyperscan):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    fitz.TOOLS.set_aa_level(0)  # Nothing is rendered, anti-aliasing is never needed
+    fitz.TOOLS.store_shrink(100)  # Start from an empty resource store
+    build_matcher(use_hyperscan)
+
+# ASCII-only case folding: every keyword is ASCII, so full Unicode lower() is not needed
+LOWER_TBL = bytes(c | 0x20 if 0x41 <= c <= 0x5A else c for c in range(256))
+
+def ascii_lower(text):
+    if text.isascii():
+        return text.lower()  # Already the fast path for pure ASCII strings
+    # For mixed text, folding the UTF-8 bytes is much cheaper; latin-1 maps them back 1:1 for the automaton
+    return text.encode('utf-8', 'replace').translate(LOWER_TBL).decode('latin-1')
+
+def find_keywords(text):
+    mask = 0
+    if len(text) < MIN_KEYWORD_LEN:
+        return mask  # Blank or image-only page: nothing to match, skip encoding and case folding
+    if hs_db is not None:
+        hit_ids = []
+        hs_db.scan(text.encode('utf-8', 'ignore'), match_event_handler=lambda kw_id, *_: hit_ids.append(kw_id))
+        for kw_id in hit_ids:
+            mask |= 1 << kw_id
+        return mask
+    for _, bit in automaton.iter(ascii_lower(text)):
+        mask |= bit
+    return mask
+
 OUTPUT_FILE = "sorted-keywords.txt"
+MAX_CONCURRENT_DOWNLOADS = 32
+# Downloaded bodies allowed to wait for or sit in the scan pool; beyond that, download slots are held back
+SCAN_QUEUE_DEPTH = (os.cpu_count() or 1) * 2
+# First pass fetches only the start of each PDF; the rest is downloaded only if that finds nothing
+PREFETCH_BYTES = 64 * 1024
+MAX_PDF_BYTES = 100 * 1024 * 1024
+# Separate connect/read deadlines: a slow but steady server is not cut off by one total timeout
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(sock_connect=3, sock_read=10)
+# Transient failures (connection resets, timeouts, 5xx) are retried with exponential backoff
+DOWNLOAD_RETRIES = 2
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = {500, 502, 503, 504}
+# Stop reading pages once this many distinct keywords were found in a PDF (0 scans every page)
+EARLY_EXIT_THRESHOLD = 1
+# VERBOSE=0 hides per-URL progress lines; findings and errors are always shown
+VERBOSE = os.environ.get("VERBOSE", "1") != "0"
+# Plain text extraction without layout flags; ligatures are expanded and whitespace normalized, which suits keyword matching
+PDF_TEXT_FLAGS = 0
 
-findings = []
-findings_lock = threading.Lock()
+# finding_masks[i] holds the keyword bits found in the i-th URL passed to process_urls (0: none).
+# A plain list of Python ints, so the mask is not capped at 64 keywords
+finding_masks = []
 stop_requested = False
 
 def signal_handler(signum, frame):
@@ -37,58 +173,177 @@ def signal_handler(signum, frame):
         print(f"\n{YELLOW}Ctrl+C detected. Finishing current tasks and saving results...{RESET}", file=sys.stderr, flush=True)
         stop_requested = True
 
-def check_pdf_url(url):
-    if stop_requested:
-        return
-    try:
-        print(f"{YELLOW}Downloading:{RESET} {url}", file=sys.stderr, flush=True)
-        response = requests.get(url, stream=True, timeout=10)
+# Runs in a worker process: parsing and matching are CPU-bound and would otherwise share one GIL
+def scan_pdf(body):
+    keyword_mask = 0
+    with fitz.open(stream=body, filetype="pdf") as doc:
+        for page in doc:
+            text = page.get_text("text", flags=PDF_TEXT_FLAGS)
+            del page  # Release the page's display list before matching
+            keyword_mask |= find_keywords(text)
+            if EARLY_EXIT_THRESHOLD and bin(keyword_mask).count("1") >= EARLY_EXIT_THRESHOLD:
+                break
+    # Fonts and images cached for this document are never reused by the next one, so empty the store
+    fitz.TOOLS.store_shrink(100)
+    return keyword_mask  # The document and its page cache are closed before the result is sent back
 
-        if response.status_code == 404:
-            print(f"{RED}Not Found (404):{RESET} {url}", file=sys.stderr, flush=True)
-            return
+# A truncated PDF may not open or may be missing pages; PyMuPDF repairs what it can
+def scan_partial_pdf(body):
+    fitz.TOOLS.mupdf_display_errors(False)  # Errors about the missing tail are expected here
+    try:
+        return scan_pdf(body)
+    except Exception:
+        return 0
+    finally:
+        fitz.TOOLS.mupdf_display_errors(True)
 
-        response.raise_for_status()
+def parse_total_size(response):
+    content_range = response.headers.get('Content-Range', '')  # e.g. "bytes 0-65535/1234567"
+    total = content_range.rpartition('/')[2]
+    if total.isdigit():
+        return int(total)
+    return response.content_length
 
-        with fitz.open(stream=response.content, filetype="pdf") as doc:
-            text = "".join(page.get_text() for page in doc)
-            matches = pattern.findall(text)
+# Streams the body, giving up as soon as it grows past MAX_PDF_BYTES; chunks are joined with a single copy
+async def read_body(response):
+    if response.content_length and response.content_length > MAX_PDF_BYTES:
+        return None
+    chunks = []
+    size = 0
+    async for chunk in response.content.iter_any():
+        size += len(chunk)
+        if size > MAX_PDF_BYTES:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
 
-            if matches:
-                found_keywords = set(matches)
-                keywords_str = ", ".join(sorted(found_keywords))
-                print(f"{GREEN}Found keywords:{RESET} {keywords_str} in {url}", flush=True)
-                with findings_lock:
-                    findings.append((url, found_keywords))
+# Returns (body, is_partial, total_size), or None after reporting the failure
+async def download(session, url, log_lines, headers=None):
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 404:
+                    log_lines.append(f"{RED}Not Found (404):{RESET} {url}\n")
+                    return None
+                if response.status in RETRY_STATUSES and attempt < DOWNLOAD_RETRIES:
+                    continue
+                response.raise_for_status()
+                body = await read_body(response)
+                if body is None:
+                    log_lines.append(f"{YELLOW}Skipping PDF larger than {MAX_PDF_BYTES // (1024 * 1024)} MB:{RESET} {url}\n")
+                    return None
+                return body, response.status == 206, parse_total_size(response)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                log_lines.append(f"{RED}Not Found (404):{RESET} {url}\n")
             else:
-                print(f"{YELLOW}No sensitive keywords found in:{RESET} {url}", file=sys.stderr, flush=True)
-
-    except requests.HTTPError as e:
-        if e.response.status_code == 404:
-            print(f"{RED}Not Found (404):{RESET} {url}", file=sys.stderr, flush=True)
-        else:
-            print(f"{RED}HTTP Error ({e.response.status_code}):{RESET} {url}", file=sys.stderr, flush=True)
-    except requests.RequestException as e:
-        print(f"{RED}Error downloading {url}: {e}{RESET}", file=sys.stderr, flush=True)
+                log_lines.append(f"{RED}HTTP Error ({e.status}):{RESET} {url}\n")
+            return None
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if attempt < DOWNLOAD_RETRIES:
+                continue
+            log_lines.append(f"{RED}Error downloading {url}: {str(e) or type(e).__name__}{RESET}\n")
+            return None
+        except aiohttp.ClientError as e:
+            log_lines.append(f"{RED}Error downloading {url}: {str(e) or type(e).__name__}{RESET}\n")
+            return None
+    return None
+
+# HEAD probe: False if the URL is clearly not worth downloading
+async def probe_pdf(session, url, log_lines):
+    try:
+        async with session.head(url, timeout=aiohttp.ClientTimeout(total=5), allow_redirects=True) as head:
+            if head.status == 404:
+                log_lines.append(f"{RED}Not Found (404):{RESET} {url}\n")
+                return False
+            if head.status >= 400:
+                return True  # Some servers reject HEAD; let the GET decide
+            content_type = head.headers.get('Content-Type', '').lower()
+            if content_type and 'pdf' not in content_type and 'octet-stream' not in content_type:
+                log_lines.append(f"{YELLOW}Skipping non-PDF content ({content_type}):{RESET} {url}\n")
+                return False
+            if head.content_length and head.content_length > MAX_PDF_BYTES:
+                log_lines.append(f"{YELLOW}Skipping PDF larger than {MAX_PDF_BYTES // (1024 * 1024)} MB:{RESET} {url}\n")
+                return False
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        pass  # Probe failures are not fatal
+    return True
+
+# The caller holds a scan slot; it is released as soon as the worker is done with the body
+async def run_scan(scan_pool, scan_slots, func, body):
+    try:
+        return await asyncio.get_running_loop().run_in_executor(scan_pool, func, body)
+    finally:
+        scan_slots.release()
+
+async def check_pdf_url(session, semaphore, scan_slots, scan_pool, index, url):
+    log_lines = []  # Progress and errors for this URL, written with one call when it is done
+    found_line = None  # The finding itself goes to stdout, after the URL's progress lines
+    try:
+        async with semaphore:
+            if stop_requested:
+                return
+            if VERBOSE:
+                log_lines.append(f"{YELLOW}Downloading:{RESET} {url}\n")
+            if not await probe_pdf(session, url, log_lines):
+                return
+            result = await download(session, url, log_lines, headers={'Range': f'bytes=0-{PREFETCH_BYTES - 1}'})
+            if result is None:
+                return
+            # Keep the download slot until the pool has room, so bodies cannot pile up in memory
+            await scan_slots.acquire()
+        body, is_partial, total_size = result
+        del result
+
+        # A 200 reply means the server ignored the Range header and sent the whole file; a 206 whose
+        # Content-Range total fits in the prefix is the whole file too. Only real prefixes hide parse errors.
+        truncated = is_partial and (total_size is None or total_size > len(body))
+        keyword_mask = await run_scan(scan_pool, scan_slots, scan_partial_pdf if truncated else scan_pdf, body)
+        if truncated and not keyword_mask:
+            del body  # Drop the prefix before fetching the full file
+            async with semaphore:
+                if stop_requested:
+                    return
+                result = await download(session, url, log_lines)
+                if result is None:
+                    return
+                await scan_slots.acquire()
+            keyword_mask = await run_scan(scan_pool, scan_slots, scan_pdf, result[0])
+
+        if keyword_mask:
+            keywords_str = ", ".join(decode_keywords(keyword_mask))
+            found_line = f"{GREEN}Found keywords:{RESET} {keywords_str} in {url}\n"
+            finding_masks[index] = keyword_mask  # Each URL owns its slot, no lock needed
+        elif VERBOSE:
+            log_lines.append(f"{YELLOW}No sensitive keywords found in:{RESET} {url}\n")
+
     except fitz.FileDataError as e:
-        print(f"{RED}Error processing PDF {url}: {e}{RESET}", file=sys.stderr, flush=True)
+        log_lines.append(f"{RED}Error processing PDF {url}: {e}{RESET}\n")
     except Exception as e:
-        print(f"{RED}Unexpected error with {url}: {e}{RESET}", file=sys.stderr, flush=True)
-
-def process_urls(urls, use_concurrency):
-    if use_concurrency:
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [executor.submit(check_pdf_url, url) for url in urls if not stop_requested]
-            for future in futures:
-                try:
-                    future.result()
-                except Exception:
-                    pass
-    else:
-        for i, url in enumerate(urls, 1):
-            if stop_requested:
-                break
-            check_pdf_url(url)
+        log_lines.append(f"{RED}Unexpected error with {url}: {e}{RESET}\n")
+    finally:
+        if log_lines:
+            sys.stderr.write("".join(log_lines))
+        if found_line:
+            sys.stdout.write(found_line)
+
+async def process_urls(urls, use_concurrency, use_hyperscan):
+    finding_masks[:] = [0] * len(urls)  # One slot per URL
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS if use_concurrency else 1)
+    scan_slots = asyncio.Semaphore(SCAN_QUEUE_DEPTH)
+    # One session for the whole run: keep-alive connections and TLS sessions are reused across URLs
+    connector = aiohttp.TCPConnector(limit=64, ttl_dns_cache=300, keepalive_timeout=30)
+    # PDFs barely compress, so ask for the raw bytes and skip decompressing them on the client
+    headers = {'Accept-Encoding': 'identity'}
+    # Spawned, not forked: the executor starts workers lazily, after the event loop, its
+    # sockets and resolver threads already exist, and a fork would copy them mid-use
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=mp_context,
+                             initializer=init_scan_worker, initargs=(use_hyperscan,)) as scan_pool:
+        async with aiohttp.ClientSession(connector=connector, timeout=REQUEST_TIMEOUT, headers=headers) as session:
+            await asyncio.gather(*(check_pdf_url(session, semaphore, scan_slots, scan_pool, index, url) for index, url in enumerate(urls)))
 
 def main():
     signal.signal(signal.SIGINT, signal_handler)
@@ -125,14 +380,22 @@ def main():
             print(f"{RED}Error creating empty output file '{OUTPUT_FILE}':{RESET} {e}", file=sys.stderr, flush=True)
         return
 
-    process_urls(urls, use_concurrency)
+    # Group URLs by host so consecutive downloads reuse the same keep-alive connections;
+    # within a host they are sorted, so each host is one sorted run of the output
+    hosts_and_urls = sorted((urlsplit(u).netloc, u) for u in urls)
+    urls = [u for _, u in hosts_and_urls]
+
+    asyncio.run(process_urls(urls, use_concurrency, hyperscan_usable()))
 
-    findings.sort(key=lambda x: x[0])
+    # The findings are already sorted within each host, which Timsort merges in close to linear time
+    findings = sorted((url, mask) for url, mask in zip(urls, finding_masks) if mask)
     try:
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            for url, keywords_set in findings:
-                keywords_str = ", ".join(sorted(keywords_set))
-                f.write(f"{url} - Found Keyword(s): {keywords_str}\n")
+        lines = [f"{url} - Found Keyword(s): {', '.join(decode_keywords(mask))}\n" for url, mask in findings]
+        # Written to a temp file and moved into place, so an interrupted save never leaves a partial file
+        tmp_path = OUTPUT_FILE + '.tmp'
+        with open(tmp_path, 'wb', buffering=1 << 20) as f:
+            f.writelines(line.encode('utf-8') for line in lines)
+        os.replace(tmp_path, OUTPUT_FILE)
         print(f"{GREEN}Results saved to '{OUTPUT_FILE}'{RESET}", file=sys.stderr, flush=True)
     except Exception as e:
         print(f"{RED}Error saving results to '{OUTPUT_FILE}':{RESET} {e}", file=sys.stderr, flush=True)